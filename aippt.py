@@ -1,4 +1,5 @@
 import datetime
+import gc
 import logging
 import os
 import json
@@ -11,6 +12,7 @@ from pptx.enum.text import MSO_AUTO_SIZE
 from pptx.util import Pt
 from pptx.enum.shapes import PP_PLACEHOLDER_TYPE
 from llm import chat
+from memprofile import profile_stage
 from langchain.schema import HumanMessage, AIMessage
 from langchain_community.chat_message_histories import ChatMessageHistory
 
@@ -26,8 +28,11 @@ logging.basicConfig(
 )
 
 
-# 初始化对话历史记录
-chat_history = ChatMessageHistory()
+# 单次请求的资源上限，防止超大请求占用过多内存
+max_pages = int(os.getenv("PPT_MAX_PAGES", "30"))
+max_content_chars = int(os.getenv("PPT_MAX_CONTENT_CHARS", "30000"))
+# 保存PPT后是否在后台预先生成预览
+export_on_save = os.getenv("PPT_EXPORT_ON_SAVE", "").lower() in ("1", "true", "yes")
 
 
 base_dir = os.path.abspath(os.path.dirname(__file__))
@@ -88,11 +93,22 @@ def generate_ppt_content(topic, pages):
 
     # print(prompt)
 
-    # 添加用户消息到对话历史
+    if int(pages) > max_pages:
+        print(f"页数{pages}超过上限{max_pages}，生成失败！")
+        return None
+
+    # 对话历史只在本次请求内有效，请求结束即释放
+    chat_history = ChatMessageHistory()
     chat_history.add_user_message(prompt)
+    max_attempts = 5  # 最大尝试次数
+
+    with profile_stage("generate_content"):
+        return _generate_ppt_content(topic, prompt, chat_history, max_attempts)
+
+
+def _generate_ppt_content(topic, prompt, chat_history, max_attempts):
     next_prompt = ""
     attempts = 0
-    max_attempts = 5  # 最大尝试次数
 
     while attempts < max_attempts:
         attempts += 1
@@ -111,6 +127,9 @@ def generate_ppt_content(topic, pages):
         # 调用llm生成PPT内容
         output = chat.invoke(messages).content
         print(output)
+        if len(output) > max_content_chars:
+            print(f"生成的内容超过{max_content_chars}个字符，生成失败！")
+            return None
 
         # 添加AI消息到对话历史
         chat_history.add_ai_message(output)
@@ -136,7 +155,76 @@ def generate_ppt_content(topic, pages):
     print("尝试次数过多，生成失败！")
     return None
 
-def generate_ppt_file(topic, ppt_content, design_number, layout_index):
+
+# 生成单页PPT内容
+def generate_page_content(topic, page_title, outline=None, hint=None):
+    """为单个页面生成内容，用于增量修改PPT时只重新生成受影响的页面
+
+    Args:
+        topic: PPT主题
+        page_title: 页面标题，为空时由模型根据大纲拟定
+        outline: 整个PPT各页标题列表，用于保持上下文连贯
+        hint: 额外的修改要求
+
+    Returns:
+        dict: 页面内容字典，包含title和content，失败时返回None
+    """
+    output_format = json.dumps({
+        "title": "title for the page",
+        "content": [
+            {
+                "title": "title for paragraph 1",
+                "description": "detail for paragraph 1",
+            },
+            {
+                "title": "title for paragraph 2",
+                "description": "detail for paragraph 2",
+            },
+        ],
+    }, ensure_ascii=True)
+
+    page_desc = f"标题为“{page_title}”的一页" if page_title else "一页"
+    outline_desc = f"整个PPT的页面标题依次为：{'、'.join(outline)}，" if outline else ""
+    hint_desc = f"修改要求：{hint}，" if hint else ""
+
+    prompt = f'''我在准备1个关于{topic}的PPT，{outline_desc}请你为其中{page_desc}生成详细内容，不要省略。
+                {hint_desc}按这个JSON格式输出{output_format}，只能返回JSON，
+                切记：1. JSON不要用```json```包裹，
+                     2. 内容要用中文，
+                     3. 字数不要超过250个字，
+                     4. 标题前面不要写“第几页”'''
+
+    next_prompt = ""
+    attempts = 0
+    max_attempts = 5  # 最大尝试次数
+
+    while attempts < max_attempts:
+        attempts += 1
+
+        # 单页生成不写入对话历史，避免上下文随修改次数增长
+        output = chat.invoke([HumanMessage(content=next_prompt or prompt)]).content
+        logging.debug(output)
+        if len(output) > max_content_chars:
+            print(f"生成的内容超过{max_content_chars}个字符，生成失败！")
+            return None
+
+        try:
+            if output.startswith("```json"):
+                output = output.replace("```json", "").replace("```", "")
+            page_content = json.loads(output)
+            if not isinstance(page_content, dict) or not isinstance(page_content.get("content"), list):
+                raise json.JSONDecodeError("缺少content字段", output, 0)
+            page_content.setdefault("title", page_title or "")
+            return page_content
+        except json.JSONDecodeError:
+            print("生成的内容格式错误，重新生成...")
+            next_prompt = f"生成的JSON格式错误，请重新按照如下提示：\n{prompt}\n生成符合格式的JSON内容。"
+            continue
+    print("尝试次数过多，生成失败！")
+    return None
+
+
+def generate_ppt_file(topic, ppt_content, design_number, layout_index, filename=None):
     """生成PPT文件
 
     Args:
@@ -144,6 +232,7 @@ def generate_ppt_file(topic, ppt_content, design_number, layout_index):
         ppt_content: PPT内容字典，包含title和pages
         design_number: 设计模板编号
         layout_index: 布局索引
+        filename: 输出文件名(不含扩展名)，默认使用主题
 
     Returns:
         str: 生成的PPT文件路径
@@ -154,18 +243,44 @@ def generate_ppt_file(topic, ppt_content, design_number, layout_index):
         print("PPT内容生成失败，请重新尝试！")
         return "PPT内容生成失败，请重新尝试！"
 
+    pages = ppt_content['pages']
+    if len(pages) > max_pages:
+        logging.warning(f"PPT内容共{len(pages)}页，超过上限{max_pages}，只生成前{max_pages}页")
+        pages = pages[:max_pages]
+
     # 1. 初始化PPT对象
-    ppt = initialize_presentation(design_number)
+    with profile_stage("initialize"):
+        ppt = initialize_presentation(design_number)
 
-    # 2. 添加首页
-    add_title_slide(ppt, ppt_content['title'])
+    try:
+        # 2. 添加首页
+        with profile_stage("title_slide"):
+            add_title_slide(ppt, ppt_content['title'])
+
+        # 3. 处理内容页
+        with profile_stage("content_slides"):
+            process_content_slides(ppt, pages, design_number, layout_index)
+
+        # 4. 保存文件
+        with profile_stage("save"):
+            ppt_path = save_presentation(ppt, filename or topic)
+    finally:
+        # Presentation的各个part之间互相引用，只能由循环垃圾回收释放，
+        # 这里主动回收，避免模板和幻灯片的lxml树在高负载下堆积。
+        # 请求内新建的对象还在年轻代，回收到第1代即可，完整回收会扫描整个堆，耗时翻倍
+        del ppt
+        gc.collect(1)
+
+    # 5. 后台生成预览，预览请求直接命中缓存
+    if export_on_save:
+        export_after_save(ppt_path)
+    return ppt_path
 
-    # 3. 处理内容页
-    process_content_slides(ppt, ppt_content['pages'], design_number, layout_index)
 
-    # 4. 保存文件
-    ppt_path = save_presentation(ppt, topic)
-    return ppt_path
+def export_after_save(ppt_path):
+    """后台生成预览，导出依赖(LibreOffice进程池)只在开启时才加载"""
+    from export import export_async
+    export_async(ppt_path)
 
 
 def initialize_presentation(design_number):
@@ -287,10 +402,12 @@ def add_simple_content_slide(ppt, page):
 
     # 清理空占位符
     clean_empty_placeholders(slide)
+    return slide
 
 
 def add_designed_content_slide(ppt, page, available_layouts, last_used_layout, slide_index):
-    """添加设计内容页"""
+    """添加设计内容页，返回新增的幻灯片，所有布局都不可用时返回None"""
+    slide = None
     slide_added = False
     attempts = set()
     max_attempts = set(available_layouts) if isinstance(available_layouts, list) else set(range(1, len(ppt.slide_layouts)))
@@ -341,6 +458,8 @@ def add_designed_content_slide(ppt, page, available_layouts, last_used_layout, s
             print(f"添加幻灯片时出错: {e}")
             continue
 
+    return slide
+
 
 def select_layout(available_layouts, last_used_layout, attempts):
     """选择布局"""
@@ -649,7 +768,8 @@ if __name__ == '__main__':
         layout_index = int(input('输入布局编号(-1-11):'))
         # 生成PPT内容
         if os.path.exists(f"{cache_dir}/{topic}.txt") and last_topic == topic and last_pages == pages:
-            ppt_content = json.load(open(f"{cache_dir}/{topic}.txt", "r", encoding="utf-8"))
+            with open(f"{cache_dir}/{topic}.txt", "r", encoding="utf-8") as f:
+                ppt_content = json.load(f)
             print("从缓存中读取PPT内容...")
         else:
             ppt_content = generate_ppt_content(topic, pages)
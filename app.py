@@ -3,7 +3,9 @@ import logging
 from flask import Flask, request, send_file, jsonify
 import os
 import json
-from aippt import generate_ppt_content, generate_ppt_file, cache_dir, ppt_dir
+from urllib.parse import quote
+from aippt import generate_ppt_content, generate_ppt_file, cache_dir, ppt_dir, max_pages
+from deck import create_deck, load_deck, revise_deck
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,10 +29,13 @@ def generate_ppt():
 
     if not all([topic, pages]):
         return jsonify({"error": "Missing required parameters topic or pages"}), 400
+    if not (str(pages).isdigit() and 1 <= int(pages) <= max_pages):
+        return jsonify({"error": f"pages must be an integer between 1 and {max_pages}"}), 400
 
     # 生成PPT内容
     if os.path.exists(f"{cache_dir}/{topic}.txt") and last_topic == topic and last_pages == pages:
-        ppt_content = json.load(open(f"{cache_dir}/{topic}.txt", "r", encoding="utf-8"))
+        with open(f"{cache_dir}/{topic}.txt", "r", encoding="utf-8") as f:
+            ppt_content = json.load(f)
         logging.info(f"从缓存中读取PPT内容...\n\n{ppt_content}")
     else:
         ppt_content = generate_ppt_content(topic, pages)
@@ -51,6 +56,64 @@ def generate_ppt():
     return f"[点击下载 PPT 文件]({download_url})"
 
 
+def _host_url():
+    host_url = request.host_url
+    return host_url if host_url != "http://host.docker.internal/" else "http://localhost:8000/"
+
+
+def _deck_response(deck):
+    return jsonify({
+        "deck_id": deck["deck_id"],
+        "content": deck["content"],
+        "download_url": f"{_host_url()}ppt/download/{deck['deck_id']}.pptx",
+    })
+
+
+@app.route('/deck', methods=['POST'])
+def create_deck_route():
+    data = request.json
+    topic = data.get('topic')
+    pages = data.get('pages')
+    design_number = data.get('design_number')
+    layout_index = data.get('layout_index')
+    design_number = design_number if design_number else 0
+    layout_index = int(layout_index) if layout_index else 0
+
+    if not all([topic, pages]):
+        return jsonify({"error": "Missing required parameters topic or pages"}), 400
+    if not (str(pages).isdigit() and 1 <= int(pages) <= max_pages):
+        return jsonify({"error": f"pages must be an integer between 1 and {max_pages}"}), 400
+
+    deck = create_deck(topic, generate_ppt_content(topic, pages), design_number, layout_index)
+    if deck is None:
+        return jsonify({"error": "Failed to generate PPT content"}), 500
+    return _deck_response(deck)
+
+
+@app.route('/deck/<deck_id>', methods=['GET'])
+def get_deck(deck_id):
+    deck = load_deck(deck_id)
+    if deck is None:
+        return jsonify({'error': 'Deck not found'}), 404
+    return _deck_response(deck)
+
+
+@app.route('/deck/<deck_id>/revise', methods=['POST'])
+def revise_deck_route(deck_id):
+    data = request.json or {}
+    try:
+        deck = revise_deck(deck_id, data.get('operations'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f'Error revising deck {deck_id}: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
+    if deck is None:
+        return jsonify({'error': 'Deck not found'}), 404
+    return _deck_response(deck)
+
+
 @app.route('/download/<filename>', methods=['GET'])
 def download_file(filename):
     file_path = os.path.join("../output/ppt", filename)
@@ -65,5 +128,55 @@ def download_file(filename):
         return jsonify({'error': str(e)}), 500
 
 
+def _export_deck(deck):
+    """生成(或读取缓存的)预览，返回(预览信息, 错误响应)"""
+    file_path = os.path.join(ppt_dir, f"{deck}.pptx")
+    if not os.path.exists(file_path):
+        app.logger.error(f'File not found: {file_path}')
+        return None, (jsonify({'error': 'File not found'}), 404)
+    try:
+        # 导出依赖 LibreOffice 相关的包，只在使用预览时导入
+        from export import export_presentation
+        return export_presentation(file_path), None
+    except Exception as e:
+        app.logger.error(f'Error exporting preview: {str(e)}')
+        return None, (jsonify({'error': str(e)}), 500)
+
+
+@app.route('/preview/<deck>', methods=['GET'])
+def preview(deck):
+    result, error = _export_deck(deck)
+    if error:
+        return error
+
+    preview_url = f"{_host_url()}ppt/preview/{quote(deck)}"
+    return jsonify({
+        "pages": result["pages"],
+        "thumbnails": [f"{preview_url}/{i}" for i in range(1, result["pages"] + 1)],
+        "pdf": f"{preview_url}/pdf" if result["pdf"] else None,
+    })
+
+
+@app.route('/preview/<deck>/<int:page>', methods=['GET'])
+def preview_thumbnail(deck, page):
+    result, error = _export_deck(deck)
+    if error:
+        return error
+    if not 1 <= page <= result["pages"]:
+        return jsonify({'error': 'Page not found'}), 404
+    return send_file(os.path.join(result["dir"], f"{page}.png"), mimetype="image/png")
+
+
+@app.route('/preview/<deck>/pdf', methods=['GET'])
+def preview_pdf(deck):
+    result, error = _export_deck(deck)
+    if error:
+        return error
+    if not result["pdf"]:
+        return jsonify({'error': 'PDF export is disabled'}), 404
+    return send_file(os.path.join(result["dir"], result["pdf"]), mimetype="application/pdf",
+                     download_name=f"{deck}.pdf")
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
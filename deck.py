@@ -0,0 +1,313 @@
+import gc
+import json
+import logging
+import os
+import threading
+import uuid
+import weakref
+
+from pptx import Presentation
+
+from aippt import (
+    base_dir,
+    ppt_dir,
+    max_pages,
+    export_on_save,
+    export_after_save,
+    generate_ppt_file,
+    generate_page_content,
+    determine_available_layouts,
+    add_simple_content_slide,
+    add_designed_content_slide,
+)
+
+
+# 存放每个deck内容的目录
+deck_dir = os.path.join(base_dir, "../output/deck")
+os.makedirs(deck_dir, exist_ok=True)
+
+# 同一个deck的修改需要串行执行，每个deck一把锁，不同deck之间互不阻塞；
+# 调用方持有锁期间锁不会被回收，没有请求使用后自动从字典中移除
+_locks = weakref.WeakValueDictionary()
+_locks_guard = threading.Lock()
+
+
+def _deck_lock(deck_id):
+    with _locks_guard:
+        lock = _locks.get(deck_id)
+        if lock is None:
+            lock = _locks[deck_id] = threading.Lock()
+        return lock
+
+
+def _deck_path(deck_id):
+    return os.path.join(deck_dir, f"{deck_id}.json")
+
+
+def deck_exists(deck_id):
+    """deck是否存在"""
+    # deck_id 由 uuid 生成，拒绝其他格式，防止路径穿越
+    return bool(deck_id) and deck_id.isalnum() and os.path.exists(_deck_path(deck_id))
+
+
+def deck_ppt_path(deck_id):
+    """deck对应的PPT文件路径"""
+    return os.path.join(ppt_dir, f"{deck_id}.pptx")
+
+
+def load_deck(deck_id):
+    """读取deck，不存在时返回None"""
+    if not deck_exists(deck_id):
+        return None
+    with open(_deck_path(deck_id), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_deck(deck):
+    with open(_deck_path(deck["deck_id"]), "w", encoding="utf-8") as f:
+        json.dump(deck, f, ensure_ascii=False, indent=4)
+
+
+def create_deck(topic, ppt_content, design_number, layout_index):
+    """根据已生成的PPT内容创建deck并生成PPT文件
+
+    Returns:
+        dict: deck信息，包含deck_id、topic、design_number、layout_index和content，
+              内容为空时返回None
+    """
+    if ppt_content is None:
+        return None
+    ppt_content["pages"] = ppt_content["pages"][:max_pages]
+
+    deck = {
+        "deck_id": uuid.uuid4().hex,
+        "topic": topic,
+        "design_number": design_number,
+        "layout_index": layout_index,
+        "content": ppt_content,
+    }
+    generate_ppt_file(topic, ppt_content, design_number, layout_index, filename=deck["deck_id"])
+    _save_deck(deck)
+    logging.info(f"创建deck {deck['deck_id']}，主题：{topic}")
+    return deck
+
+
+def _page_index(pages, page, allow_append=False):
+    """将从1开始的页码转换为列表索引"""
+    upper = len(pages) + 1 if allow_append else len(pages)
+    if type(page) is not int or not 1 <= page <= upper:
+        raise ValueError(f"页码{page}超出范围(1-{upper})")
+    return page - 1
+
+
+def _check_title(title):
+    if title is not None and not isinstance(title, str):
+        raise ValueError("title必须是字符串")
+    return title
+
+
+def _check_content(content):
+    """校验客户端提供的段落列表"""
+    if not isinstance(content, list):
+        raise ValueError("content必须是段落列表")
+    for item in content:
+        if not (isinstance(item, dict)
+                and isinstance(item.get("title"), str)
+                and isinstance(item.get("description"), str)):
+            raise ValueError("content中的每个段落必须包含字符串类型的title和description")
+    return content
+
+
+def _content_page(title, content):
+    """客户端直接提供内容的页面，必须有标题"""
+    if not isinstance(title, str) or not title.strip():
+        raise ValueError("提供content时必须提供非空的title")
+    return {"page": {"title": title, "content": _check_content(content)}, "pending": None, "slide_id": None}
+
+
+def _pending_page(title, hint):
+    """需要调用llm生成的页面，所有操作校验通过后再统一生成"""
+    if hint is not None and not isinstance(hint, str):
+        raise ValueError("hint必须是字符串")
+    return {"page": None, "pending": {"title": title, "hint": hint}, "slide_id": None}
+
+
+def _entry_title(entry):
+    return entry["page"]["title"] if entry["page"] is not None else entry["pending"]["title"]
+
+
+def _apply_operation(entries, stale_ids, op):
+    """在页面列表上应用单个操作，只做校验和记录，不调用llm
+
+    需要重新渲染的页面slide_id置为None，需要llm生成的页面记录在pending中。
+    """
+    if not isinstance(op, dict):
+        raise ValueError("每个操作必须是JSON对象")
+    name = op.get("op")
+
+    if name == "regenerate":
+        i = _page_index(entries, op.get("page"))
+        title = _check_title(op.get("title")) or _entry_title(entries[i])
+        stale_ids.append(entries[i]["slide_id"])
+        entries[i] = _pending_page(title, op.get("hint"))
+    elif name == "edit":
+        i = _page_index(entries, op.get("page"))
+        entry = dict(entries[i], slide_id=None)
+        title = _check_title(op.get("title"))
+        if op.get("content") is not None:
+            entry = _content_page(title or _entry_title(entry), op["content"])
+        elif title is not None:
+            if entry["page"] is not None:
+                entry["page"] = dict(entry["page"], title=title)
+            else:
+                entry["pending"] = dict(entry["pending"], title=title)
+        stale_ids.append(entries[i]["slide_id"])
+        entries[i] = entry
+    elif name == "insert":
+        i = _page_index(entries, op.get("page"), allow_append=True)
+        if len(entries) >= max_pages:
+            raise ValueError(f"页数已达到上限{max_pages}，不能继续插入")
+        title = _check_title(op.get("title"))
+        if op.get("content") is not None:
+            entry = _content_page(title, op["content"])
+        else:
+            entry = _pending_page(title, op.get("hint"))
+        entries.insert(i, entry)
+    elif name == "delete":
+        i = _page_index(entries, op.get("page"))
+        stale_ids.append(entries.pop(i)["slide_id"])
+    elif name == "reorder":
+        order = op.get("order")
+        if (not isinstance(order, list) or not all(type(page) is int for page in order)
+                or sorted(order) != list(range(1, len(entries) + 1))):
+            raise ValueError(f"order必须是1-{len(entries)}的排列")
+        entries[:] = [entries[page - 1] for page in order]
+    else:
+        raise ValueError(f"不支持的操作: {name}")
+
+
+def _generate_pending_pages(deck, entries):
+    """调用llm生成所有待生成的页面"""
+    outline = [title for title in map(_entry_title, entries) if title]
+    for entry in entries:
+        if entry["pending"] is None:
+            continue
+        title = entry["pending"]["title"]
+        page = generate_page_content(deck["topic"], title, outline, entry["pending"]["hint"])
+        if page is None:
+            raise RuntimeError(f"页面“{title}”内容生成失败")
+        entry["page"], entry["pending"] = page, None
+
+
+def _render_page(ppt, page, design_number, layout_index, slide_index):
+    """渲染单个内容页，新幻灯片追加在末尾"""
+    if design_number == 0:
+        return add_simple_content_slide(ppt, page)
+    available_layouts = determine_available_layouts(ppt, layout_index)
+    return add_designed_content_slide(ppt, page, available_layouts, -1, slide_index)
+
+
+def _delete_slide(ppt, sld_id):
+    """从演示文稿中删除幻灯片"""
+    ppt.slides._sldIdLst.remove(sld_id)
+    ppt.part.drop_rel(sld_id.rId)
+
+
+def _renumber_slides(ppt):
+    """页面顺序变化后更新幻灯片编号占位符"""
+    for index, slide in enumerate(ppt.slides):
+        if index == 0:
+            continue
+        for ph in slide.placeholders:
+            try:
+                if ph.placeholder_format.type == 13:  # 幻灯片编号
+                    ph.text = str(index)
+            except Exception as e:
+                print(f"更新幻灯片编号失败: {e}")
+
+
+def _revise_presentation(deck, ppt, ppt_path, operations):
+    """应用操作并保存PPT文件，deck["content"]会被原地更新"""
+    slide_ids = list(ppt.slides._sldIdLst) if ppt is not None else []
+    pages = deck["content"]["pages"]
+
+    # 幻灯片与页面一一对应时才能增量渲染，否则重新生成整个文件
+    incremental = len(slide_ids) == len(pages) + 1
+    entries = [
+        {"page": page, "pending": None, "slide_id": slide_ids[i + 1] if incremental else None}
+        for i, page in enumerate(pages)
+    ]
+    stale_ids = []
+    # 先校验全部操作，都合法后再调用llm，避免后面的操作出错时白白浪费生成结果
+    for op in operations:
+        _apply_operation(entries, stale_ids, op)
+    _generate_pending_pages(deck, entries)
+
+    deck["content"]["pages"] = [entry["page"] for entry in entries]
+
+    if not incremental:
+        logging.info(f"deck {deck['deck_id']} 的幻灯片与内容不一致，重新生成整个PPT")
+        generate_ppt_file(deck["topic"], deck["content"], deck["design_number"],
+                          deck["layout_index"], filename=deck["deck_id"])
+        return
+
+    for i, entry in enumerate(entries):
+        if entry["slide_id"] is not None:
+            continue
+        logging.info(f'重新渲染第{i + 1}页:{entry["page"]["title"]}')
+        slide = _render_page(ppt, entry["page"], deck["design_number"], deck["layout_index"], i)
+        if slide is None:
+            raise RuntimeError(f"第{i + 1}页没有可用的布局")
+        entry["slide_id"] = ppt.slides._sldIdLst[-1]
+
+    # 同一批操作中新增后又被替换或删除的页面没有对应的幻灯片
+    for sld_id in stale_ids:
+        if sld_id is not None:
+            _delete_slide(ppt, sld_id)
+
+    # 按页面顺序重排幻灯片，append 会把已有元素移动到末尾
+    sld_id_lst = ppt.slides._sldIdLst
+    for sld_id in [slide_ids[0]] + [entry["slide_id"] for entry in entries]:
+        sld_id_lst.append(sld_id)
+
+    _renumber_slides(ppt)
+    ppt.save(ppt_path)
+    if export_on_save:
+        export_after_save(ppt_path)
+
+
+def revise_deck(deck_id, operations):
+    """按页面操作增量修改deck，只重新生成和渲染受影响的页面
+
+    支持的操作(页码从1开始)：
+        {"op": "regenerate", "page": 2, "hint": "..."}         调用llm重新生成第2页
+        {"op": "edit", "page": 2, "title": "...", "content": [...]}  直接修改第2页文本
+        {"op": "insert", "page": 2, "title": "...", "content": [...]} 在第2页插入新页面，不提供content时调用llm生成
+        {"op": "delete", "page": 2}                              删除第2页
+        {"op": "reorder", "order": [3, 1, 2]}                    按新顺序排列页面
+
+    Returns:
+        dict: 修改后的deck，deck不存在时返回None
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("operations必须是非空列表")
+    if not deck_exists(deck_id):
+        return None
+
+    # 保存引用，保证修改期间同一deck的请求拿到的是同一把锁
+    lock = _deck_lock(deck_id)
+    with lock:
+        deck = load_deck(deck_id)
+        if deck is None:
+            return None
+
+        ppt_path = deck_ppt_path(deck_id)
+        ppt = Presentation(ppt_path) if os.path.exists(ppt_path) else None
+        try:
+            _revise_presentation(deck, ppt, ppt_path, operations)
+        finally:
+            # 与 aippt.generate_ppt_file 相同，主动回收Presentation
+            del ppt
+            gc.collect(1)
+        _save_deck(deck)
+        return deck
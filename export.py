@@ -0,0 +1,303 @@
+"""PPT导出：生成幻灯片缩略图和PDF，供预览使用
+
+转换由常驻的 headless LibreOffice 进程池完成(每个进程由 unoserver 管理)，
+避免每个文件都重新启动 soffice；结果按PPT文件内容的哈希缓存，内容不变时直接复用。
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pymupdf
+from dotenv import load_dotenv
+from unoserver.client import UnoClient
+
+load_dotenv()
+
+
+base_dir = os.path.abspath(os.path.dirname(__file__))
+# 预览缓存目录，每个子目录对应一个PPT内容哈希
+preview_dir = os.path.join(base_dir, "../output/preview")
+os.makedirs(preview_dir, exist_ok=True)
+
+# soffice 进程数量
+pool_size = int(os.getenv("EXPORT_WORKERS", "2"))
+# 每个进程转换多少个文件后重启，释放 LibreOffice 累积的内存
+max_conversions = int(os.getenv("EXPORT_MAX_CONVERSIONS", "200"))
+# 单个文件的转换超时(秒)
+convert_timeout = int(os.getenv("EXPORT_TIMEOUT", "120"))
+# soffice 可执行文件路径，为空时从PATH查找
+soffice_executable = os.getenv("EXPORT_SOFFICE") or None
+# 运行 unoserver 的python，必须能导入 LibreOffice 的 uno 模块(Debian 的 python3-uno 属于系统python)
+soffice_python = os.getenv("EXPORT_PYTHON", "/usr/bin/python3")
+# 缩略图宽度(像素)
+thumbnail_width = int(os.getenv("PREVIEW_WIDTH", "480"))
+# 是否保留PDF
+keep_pdf = os.getenv("PREVIEW_KEEP_PDF", "1").lower() in ("1", "true", "yes")
+# 最多缓存多少个PPT的预览
+cache_limit = int(os.getenv("PREVIEW_CACHE_LIMIT", "200"))
+# 最近使用过的预览在这段时间(秒)内不会被清理，避免正在发送的文件被删除
+prune_grace = int(os.getenv("PREVIEW_PRUNE_GRACE", "300"))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class SofficeWorker:
+    """常驻的 unoserver + soffice 进程，首次使用时启动，异常退出后自动重启"""
+
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.port = None
+        self.profile = None
+        self.conversions = 0
+
+    def start(self):
+        self.port = _free_port()
+        self.profile = tempfile.mkdtemp(prefix=f"aippt-soffice-{self.index}-")
+
+        cmd = [
+            soffice_python, "-m", "unoserver.server",
+            "--interface", "127.0.0.1",
+            "--port", str(self.port),
+            "--uno-port", str(_free_port()),
+            "--user-installation", self.profile,
+            "--conversion-timeout", str(convert_timeout),
+            "--quiet",
+        ]
+        if soffice_executable:
+            cmd += ["--executable", soffice_executable]
+
+        logging.info(f"启动soffice进程{self.index}，端口：{self.port}")
+        # 单独的进程组，停止时连同 soffice 子进程一起结束
+        self.process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                        start_new_session=True)
+        self.conversions = 0
+
+        deadline = time.monotonic() + convert_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                self.stop()
+                raise RuntimeError(f"soffice进程{self.index}启动失败，请检查LibreOffice以及{soffice_python}能否导入uno和unoserver")
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.5)
+        self.stop()
+        raise RuntimeError(f"soffice进程{self.index}启动超时")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGTERM)
+                self.process.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                try:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+        self.process = None
+        if self.profile:
+            shutil.rmtree(self.profile, ignore_errors=True)
+            self.profile = None
+
+    def convert(self, data, convert_to):
+        if self.process is None or self.process.poll() is not None or self.conversions >= max_conversions:
+            self.stop()
+            self.start()
+        self.conversions += 1
+        return UnoClient(port=str(self.port)).convert(indata=data, convert_to=convert_to)
+
+
+class SofficePool:
+    """soffice 进程池，同一时间每个进程只处理一个文件"""
+
+    def __init__(self, size):
+        self._workers = [SofficeWorker(i) for i in range(size)]
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+        atexit.register(self.close)
+
+    def convert(self, data, convert_to="pdf"):
+        try:
+            worker = self._idle.get(timeout=convert_timeout)
+        except queue.Empty:
+            raise TimeoutError("等待空闲的soffice进程超时")
+        try:
+            return worker.convert(data, convert_to)
+        except Exception:
+            # 转换失败时进程状态不可信，下次使用时重启
+            worker.stop()
+            raise
+        finally:
+            self._idle.put(worker)
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
+
+
+pool = SofficePool(pool_size)
+_executor = ThreadPoolExecutor(max_workers=pool_size)
+# 按哈希分段加锁，同一内容只转换一次
+_locks = [threading.Lock() for _ in range(64)]
+
+
+# 预览目录名，即内容哈希
+_digest_pattern = re.compile(r"[0-9a-f]{32}")
+
+# 文件路径 -> ((mtime_ns, size), 内容哈希)，文件没有变化时不必重新读取和计算哈希
+_digests = OrderedDict()
+_digests_lock = threading.Lock()
+_digests_limit = 1024
+
+
+def _lock_for(digest):
+    return _locks[int(digest, 16) % len(_locks)]
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _cached_digest(path, key):
+    with _digests_lock:
+        cached = _digests.get(path)
+        if cached is None or cached[0] != key:
+            return None
+        _digests.move_to_end(path)
+        return cached[1]
+
+
+def _remember_digest(path, key, digest):
+    with _digests_lock:
+        _digests[path] = (key, digest)
+        _digests.move_to_end(path)
+        while len(_digests) > _digests_limit:
+            _digests.popitem(last=False)
+
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, "index.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def render_thumbnails(pdf_data, out_dir):
+    """将PDF每一页渲染为PNG缩略图，返回页数"""
+    with pymupdf.open(stream=pdf_data, filetype="pdf") as doc:
+        for i, page in enumerate(doc, 1):
+            zoom = thumbnail_width / page.rect.width
+            page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom)).save(os.path.join(out_dir, f"{i}.png"))
+        return doc.page_count
+
+
+def _prune_cache():
+    # 只处理哈希命名的预览目录，忽略临时目录和其他文件
+    entries = [name for name in os.listdir(preview_dir)
+               if _digest_pattern.fullmatch(name) and os.path.isdir(os.path.join(preview_dir, name))]
+    if len(entries) <= cache_limit:
+        return
+
+    # 按修改时间排序，删除最旧的预览；最近用过的和正在处理的跳过
+    entries.sort(key=lambda name: os.path.getmtime(os.path.join(preview_dir, name)))
+    deadline = time.time() - prune_grace
+    for name in entries[:len(entries) - cache_limit]:
+        path = os.path.join(preview_dir, name)
+        lock = _lock_for(name)
+        if not lock.acquire(blocking=False):
+            continue
+        try:
+            if os.path.getmtime(path) < deadline:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+        finally:
+            lock.release()
+
+
+def export_presentation(ppt_path):
+    """生成PPT的缩略图和PDF，内容相同的PPT只转换一次
+
+    Returns:
+        dict: digest为内容哈希，dir为预览目录，pages为页数，pdf为PDF文件名(未保留时为None)
+    """
+    # 文件没有变化且预览已生成时直接返回，不再读取文件
+    key = _file_key(ppt_path)
+    digest = _cached_digest(ppt_path, key)
+    if digest is not None:
+        out_dir = os.path.join(preview_dir, digest)
+        with _lock_for(digest):
+            manifest = _load_manifest(out_dir)
+            if manifest is not None:
+                os.utime(out_dir)
+                return dict(manifest, digest=digest, dir=out_dir)
+
+    # 只读取一次文件，哈希和转换使用同一份内容，避免文件被并发改写时缓存错位
+    with open(ppt_path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    out_dir = os.path.join(preview_dir, digest)
+    # 读取前后文件状态一致，说明读到的是完整的同一版本，才缓存哈希
+    if _file_key(ppt_path) == key:
+        _remember_digest(ppt_path, key, digest)
+
+    with _lock_for(digest):
+        manifest = _load_manifest(out_dir)
+        if manifest is None:
+            logging.info(f"生成预览：{ppt_path}")
+            pdf_data = pool.convert(data, "pdf")
+
+            # 先写入临时目录再改名，避免读到生成到一半的预览
+            tmp_dir = f"{out_dir}.tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            manifest = {"pages": render_thumbnails(pdf_data, tmp_dir), "pdf": None}
+            if keep_pdf:
+                manifest["pdf"] = "deck.pdf"
+                with open(os.path.join(tmp_dir, manifest["pdf"]), "wb") as f:
+                    f.write(pdf_data)
+            with open(os.path.join(tmp_dir, "index.json"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            shutil.rmtree(out_dir, ignore_errors=True)
+            os.replace(tmp_dir, out_dir)
+        else:
+            # 更新修改时间，清理缓存时优先保留常用的预览
+            os.utime(out_dir)
+    del data
+
+    _prune_cache()
+    return dict(manifest, digest=digest, dir=out_dir)
+
+
+def _export_in_background(ppt_path):
+    try:
+        export_presentation(ppt_path)
+    except Exception as e:
+        logging.warning(f"后台生成预览失败: {e}")
+
+
+def export_async(ppt_path):
+    """在后台生成预览，不阻塞PPT生成"""
+    return _executor.submit(_export_in_background, ppt_path)
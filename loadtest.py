@@ -0,0 +1,288 @@
+"""压测 app.py 的 /generate 和 /download/<filename> 接口，用于容量评估和回归检查
+
+配合 mock_llm.py 使用时，延迟和吞吐只反映 aippt 本身的开销。
+示例：
+    # 逐级增加并发，寻找饱和点
+    python loadtest.py --url http://localhost:5000 --concurrency 1,2,4,8,16 \\
+        --requests 50 --pages 8 --server-pid $(pgrep -f "flask run") --json result.json
+
+    # 与基线比较，吞吐或p95延迟劣化超过10%时返回非0退出码
+    python loadtest.py --concurrency 8 --requests 200 --baseline result.json --max-regression 0.1
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def read_rss(pid):
+    """读取进程及其子进程的常驻内存(字节)，仅支持Linux"""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", "r") as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+
+    total = 0
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total or None
+
+
+class RssSampler(threading.Thread):
+    """后台定期采样服务端内存"""
+
+    def __init__(self, pid, interval):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            rss = read_rss(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+def http_request(method, url, payload=None, timeout=600):
+    """发送请求，返回(状态码, 响应体字节数, 响应体, 耗时秒)"""
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(url, data=data, method=method)
+    if data is not None:
+        req.add_header("Content-Type", "application/json")
+
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        status = e.code
+    except Exception as e:
+        body = str(e).encode("utf-8")
+        status = type(e).__name__
+    return status, len(body), body, time.perf_counter() - start
+
+
+def download_filename(body):
+    """从 /generate 返回的markdown链接中解析文件名"""
+    text = body.decode("utf-8", errors="replace")
+    if "](" not in text:
+        return None
+    url = text.rsplit("](", 1)[1].rstrip(")").strip()
+    return url.rsplit("/", 1)[-1]
+
+
+def run_one(args, index, record):
+    topic = args.topic if args.reuse_topic else f"{args.topic}-{os.getpid()}-{index}"
+    payload = {
+        "topic": topic,
+        "pages": args.pages,
+        "design_number": args.design_number,
+        "layout_index": args.layout_index,
+    }
+    status, size, body, elapsed = http_request("POST", f"{args.url}/generate", payload, args.timeout)
+    record("generate", status, size, elapsed)
+    if status != 200 or not args.download:
+        return
+
+    filename = download_filename(body)
+    if filename is None:
+        record("download", "BadResponse", 0, 0.0)
+        return
+    # 文件名可能已被编码，统一按原文编码一次
+    filename = urllib.parse.quote(urllib.parse.unquote(filename))
+    status, size, _, elapsed = http_request("GET", f"{args.url}/download/{filename}", timeout=args.timeout)
+    record("download", status, size, elapsed)
+
+
+def run_stage(args, concurrency):
+    """以固定并发执行一轮压测，返回统计结果"""
+    results = {}
+    lock = threading.Lock()
+
+    def record(endpoint, status, size, elapsed):
+        with lock:
+            stats = results.setdefault(endpoint, {"latencies": [], "statuses": {}, "bytes": 0})
+            stats["latencies"].append(elapsed)
+            stats["statuses"][str(status)] = stats["statuses"].get(str(status), 0) + 1
+            stats["bytes"] += size
+
+    sampler = RssSampler(args.server_pid, args.rss_interval) if args.server_pid else None
+    if sampler:
+        sampler.start()
+
+    deadline = time.monotonic() + args.duration if args.duration else None
+    counter = iter(range(sys.maxsize))
+    counter_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with counter_lock:
+                index = next(counter)
+            if deadline is not None:
+                if time.monotonic() >= deadline:
+                    return
+            elif index >= args.requests:
+                return
+            run_one(args, index, record)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - start
+
+    if sampler:
+        sampler.stop()
+
+    report = {"concurrency": concurrency, "wall_seconds": wall, "endpoints": {}}
+    for endpoint, stats in results.items():
+        latencies = stats["latencies"]
+        count = len(latencies)
+        errors = sum(n for status, n in stats["statuses"].items() if status != "200")
+        report["endpoints"][endpoint] = {
+            "requests": count,
+            "throughput": count / wall if wall else 0.0,
+            "error_rate": errors / count if count else 0.0,
+            "statuses": stats["statuses"],
+            "avg_bytes": stats["bytes"] / count if count else 0,
+            "latency": {
+                "p50": percentile(latencies, 50),
+                "p90": percentile(latencies, 90),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": max(latencies) if latencies else None,
+            },
+        }
+    if sampler and sampler.samples:
+        report["rss"] = {
+            "start": sampler.samples[0],
+            "end": sampler.samples[-1],
+            "max": max(sampler.samples),
+        }
+    return report
+
+
+def format_ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}ms"
+
+
+def print_report(report):
+    print(f"\n并发 {report['concurrency']}，耗时 {report['wall_seconds']:.1f}s")
+    for endpoint, stats in report["endpoints"].items():
+        latency = stats["latency"]
+        print(f"  {endpoint:<9} 请求 {stats['requests']:<6} 吞吐 {stats['throughput']:.2f}/s  "
+              f"错误率 {stats['error_rate']:.1%}  "
+              f"p50 {format_ms(latency['p50'])}  p90 {format_ms(latency['p90'])}  "
+              f"p95 {format_ms(latency['p95'])}  p99 {format_ms(latency['p99'])}  max {format_ms(latency['max'])}  "
+              f"状态 {stats['statuses']}")
+    if "rss" in report:
+        rss = report["rss"]
+        print(f"  RSS 开始 {rss['start'] / 2 ** 20:.1f}MB  结束 {rss['end'] / 2 ** 20:.1f}MB  "
+              f"峰值 {rss['max'] / 2 ** 20:.1f}MB")
+
+
+def compare_baseline(reports, baseline, max_regression):
+    """与基线逐个并发级别比较 /generate 的吞吐和p95，返回劣化项列表"""
+    baseline_stages = {stage["concurrency"]: stage for stage in baseline.get("stages", [])}
+    regressions = []
+    for report in reports:
+        base = baseline_stages.get(report["concurrency"])
+        if not base or "generate" not in base["endpoints"] or "generate" not in report["endpoints"]:
+            continue
+        current, previous = report["endpoints"]["generate"], base["endpoints"]["generate"]
+        if current["throughput"] < previous["throughput"] * (1 - max_regression):
+            regressions.append(f"并发{report['concurrency']} 吞吐 "
+                               f"{previous['throughput']:.2f}/s -> {current['throughput']:.2f}/s")
+        if (current["latency"]["p95"] or 0) > (previous["latency"]["p95"] or 0) * (1 + max_regression):
+            regressions.append(f"并发{report['concurrency']} p95 "
+                               f"{format_ms(previous['latency']['p95'])} -> {format_ms(current['latency']['p95'])}")
+        if current["error_rate"] > previous["error_rate"] + max_regression:
+            regressions.append(f"并发{report['concurrency']} 错误率 "
+                               f"{previous['error_rate']:.1%} -> {current['error_rate']:.1%}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="aippt 压测工具")
+    parser.add_argument("--url", default="http://localhost:5000", help="app.py 服务地址")
+    parser.add_argument("--concurrency", default="4", help="并发数，逗号分隔时逐级压测，如 1,2,4,8")
+    parser.add_argument("--requests", type=int, default=20, help="每个并发级别的请求数")
+    parser.add_argument("--duration", type=float, default=0, help="每个并发级别的持续秒数，设置后忽略--requests")
+    parser.add_argument("--topic", default="压测主题")
+    parser.add_argument("--reuse-topic", action="store_true", help="所有请求使用相同主题(会命中内容缓存)")
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--design-number", type=int, default=1)
+    parser.add_argument("--layout-index", type=int, default=0)
+    parser.add_argument("--no-download", dest="download", action="store_false", help="不请求下载接口")
+    parser.add_argument("--timeout", type=float, default=600, help="单个请求超时秒数")
+    parser.add_argument("--server-pid", type=int, default=None, help="服务端进程号，用于采样RSS")
+    parser.add_argument("--rss-interval", type=float, default=0.5, help="RSS采样间隔秒数")
+    parser.add_argument("--json", dest="json_path", default=None, help="将结果写入JSON文件")
+    parser.add_argument("--baseline", default=None, help="基线结果JSON文件")
+    parser.add_argument("--max-regression", type=float, default=0.1, help="允许的劣化比例")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.url = args.url.rstrip("/")
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+
+    reports = []
+    for concurrency in levels:
+        report = run_stage(args, concurrency)
+        print_report(report)
+        reports.append(report)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "stages": reports}, f, ensure_ascii=False, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_baseline(reports, json.load(f), args.max_regression)
+        if regressions:
+            print("\n性能劣化：")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\n未发现性能劣化")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""基于 tracemalloc 的分阶段内存分析
+
+设置环境变量 PPT_MEMORY_PROFILE=1 后，aippt.py 各阶段结束时会输出该阶段的净增内存、
+峰值以及分配最多的代码行。tracemalloc 统计的是整个进程，并发请求时各阶段的数据会互相混杂，
+建议单并发(如 loadtest.py --concurrency 1 或 soak.py)下使用。
+"""
+import logging
+import os
+import tracemalloc
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+enabled = os.getenv("PPT_MEMORY_PROFILE", "").lower() in ("1", "true", "yes")
+# 每个阶段输出的分配热点数量
+top_n = int(os.getenv("PPT_MEMORY_PROFILE_TOP", "10"))
+
+_snapshot_filters = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+]
+
+
+def _take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(_snapshot_filters)
+
+
+@contextmanager
+def profile_stage(stage):
+    """统计代码块的内存分配，未开启分析时不产生额外开销"""
+    if not enabled:
+        yield
+        return
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    before = _take_snapshot()
+    start_current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        stats = _take_snapshot().compare_to(before, "lineno")
+        logging.info(f"[内存分析] {stage}: 净增 {(current - start_current) / 1024:.1f}KB，"
+                     f"峰值 {(peak - start_current) / 1024:.1f}KB")
+        for stat in stats[:top_n]:
+            logging.info(f"[内存分析] {stage}:   {stat}")
@@ -0,0 +1,185 @@
+"""本地模拟的 OpenAI 兼容聊天接口，用于压测和容量评估
+
+llm.py 通过环境变量指向本服务即可，不会产生真实的模型调用费用：
+    CHAT_API_BASE=http://localhost:8001/v1
+    CHAT_API_KEY=mock
+    CHAT_MODEL=mock
+
+启动示例：
+    python mock_llm.py --port 8001 --latency-dist lognormal --latency-ms 800 \\
+        --tokens-per-sec 60 --malformed-rate 0.05 --rate-limit-rate 0.02
+"""
+import argparse
+import json
+import math
+import random
+import re
+import time
+import uuid
+
+from flask import Flask, request, jsonify
+
+
+app = Flask(__name__)
+
+# 运行参数，由命令行覆盖
+config = {
+    "latency_dist": "fixed",  # fixed / uniform / normal / lognormal / exponential
+    "latency_ms": 0.0,  # 首字延迟均值(毫秒)
+    "latency_jitter_ms": 0.0,  # 延迟抖动(uniform为半宽，normal/lognormal为标准差)
+    "tokens_per_sec": 0.0,  # 输出速率，0表示不限速
+    "malformed_rate": 0.0,  # 返回非法JSON的概率
+    "rate_limit_rate": 0.0,  # 返回429的概率
+    "retry_after": 1,  # 429响应的Retry-After秒数
+    "seed": None,
+}
+
+rng = random.Random()
+
+
+def sample_latency():
+    """按配置的分布采样首字延迟(秒)"""
+    mean = config["latency_ms"]
+    jitter = config["latency_jitter_ms"]
+    dist = config["latency_dist"]
+
+    if mean <= 0:
+        return 0.0
+    if dist == "uniform":
+        value = rng.uniform(mean - jitter, mean + jitter)
+    elif dist == "normal":
+        value = rng.gauss(mean, jitter)
+    elif dist == "lognormal":
+        # 按均值和标准差换算对数正态分布参数
+        sigma2 = math.log(1 + (jitter / mean) ** 2)
+        value = rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+    elif dist == "exponential":
+        value = rng.expovariate(1 / mean)
+    else:
+        value = mean
+    return max(value, 0.0) / 1000
+
+
+def estimate_tokens(text):
+    """粗略估算token数：中文按字计，其他按4个字符1个token"""
+    chinese = sum(1 for char in text if '\u4e00' <= char <= '\u9fff')
+    return chinese + (len(text) - chinese) // 4 + 1
+
+
+def fake_paragraphs(prefix, count):
+    return [
+        {
+            "title": f"{prefix}要点{i + 1}",
+            "description": f"这是关于{prefix}第{i + 1}个要点的详细说明，用于压测时模拟真实的正文长度。" * 2,
+        }
+        for i in range(count)
+    ]
+
+
+def fake_content(prompt):
+    """根据 aippt.py 的提示词构造符合格式的内容"""
+    topic_match = re.search(r"关于(.+?)的PPT", prompt)
+    topic = topic_match.group(1) if topic_match else "示例主题"
+
+    # 单页生成(generate_page_content)
+    page_match = re.search(r"标题为“(.+?)”的一页", prompt)
+    if "请你为其中" in prompt:
+        title = page_match.group(1) if page_match else f"{topic}补充"
+        return {"title": title, "content": fake_paragraphs(title, rng.randint(2, 4))}
+
+    # 整个PPT生成(generate_ppt_content)
+    pages_match = re.search(r"一共写(\d+)页", prompt)
+    pages = int(pages_match.group(1)) if pages_match else 5
+    return {
+        "title": topic,
+        "pages": [
+            {"title": f"{topic}第{i + 1}部分", "content": fake_paragraphs(f"{topic}第{i + 1}部分", rng.randint(2, 4))}
+            for i in range(pages)
+        ],
+    }
+
+
+def error_response(status, message, error_type):
+    return jsonify({"error": {"message": message, "type": error_type, "code": status}}), status
+
+
+@app.route('/v1/models', methods=['GET'])
+def list_models():
+    return jsonify({"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]})
+
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    data = request.json or {}
+    messages = data.get("messages") or []
+    if data.get("stream"):
+        return error_response(400, "stream is not supported by the mock server", "invalid_request_error")
+
+    if rng.random() < config["rate_limit_rate"]:
+        response, status = error_response(429, "Rate limit reached (mock)", "rate_limit_exceeded")
+        response.headers["Retry-After"] = str(config["retry_after"])
+        return response, status
+
+    # aippt.py 把当前提示词放在第一条消息
+    prompt = ""
+    for message in messages:
+        if message.get("role") == "user":
+            prompt = message.get("content") or ""
+            break
+
+    content = json.dumps(fake_content(prompt), ensure_ascii=False)
+    if rng.random() < config["malformed_rate"]:
+        # 截断JSON，触发 aippt.py 的重试逻辑
+        content = content[:len(content) // 2]
+
+    prompt_tokens = sum(estimate_tokens(message.get("content") or "") for message in messages)
+    completion_tokens = estimate_tokens(content)
+
+    delay = sample_latency()
+    if config["tokens_per_sec"] > 0:
+        delay += completion_tokens / config["tokens_per_sec"]
+    time.sleep(delay)
+
+    return jsonify({
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": data.get("model") or "mock",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    })
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="模拟的 OpenAI 兼容聊天接口")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "normal", "lognormal", "exponential"],
+                        default=config["latency_dist"], help="首字延迟分布")
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"], help="首字延迟均值(毫秒)")
+    parser.add_argument("--latency-jitter-ms", type=float, default=config["latency_jitter_ms"],
+                        help="延迟抖动(毫秒)，uniform为半宽，normal/lognormal为标准差")
+    parser.add_argument("--tokens-per-sec", type=float, default=config["tokens_per_sec"],
+                        help="模拟输出速率，0表示不限速")
+    parser.add_argument("--malformed-rate", type=float, default=config["malformed_rate"],
+                        help="返回非法JSON的概率(0-1)")
+    parser.add_argument("--rate-limit-rate", type=float, default=config["rate_limit_rate"],
+                        help="返回429的概率(0-1)")
+    parser.add_argument("--retry-after", type=int, default=config["retry_after"], help="429响应的Retry-After秒数")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子，便于复现")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    config.update({key: value for key, value in vars(args).items() if key in config})
+    rng.seed(args.seed)
+    app.run(host=args.host, port=args.port, threaded=True)
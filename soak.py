@@ -0,0 +1,122 @@
+"""长时间稳定性测试：用模拟的llm反复生成PPT，检查进程常驻内存是否保持平稳
+
+不依赖真实模型和网络，llm输出由 mock_llm.py 的内容生成逻辑直接构造。
+示例：
+    python soak.py --iterations 2000 --pages 8 --design-number 1 --max-growth-mb 30
+    python soak.py --mode revise --iterations 2000
+预热后RSS采样的峰值较基准增长超过 --max-growth-mb 时返回非0退出码。
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+# llm.py 导入时需要模型配置，这里用不到真实模型
+os.environ.setdefault("CHAT_MODEL", "mock")
+os.environ.setdefault("CHAT_API_KEY", "mock")
+os.environ.setdefault("CHAT_API_BASE", "http://localhost:8001/v1")
+
+import aippt
+from loadtest import read_rss
+from mock_llm import fake_content
+
+
+class FakeChat:
+    """替代 llm.chat，按提示词直接返回符合格式的内容"""
+
+    def invoke(self, messages):
+        return SimpleNamespace(content=json.dumps(fake_content(messages[0].content), ensure_ascii=False))
+
+
+def run_generate(args):
+    """每次迭代重新生成整个PPT"""
+    def step(i):
+        content = aippt.generate_ppt_content("soak", args.pages)
+        aippt.generate_ppt_file("soak", content, args.design_number, args.layout_index)
+    return step
+
+
+def run_revise(args):
+    """每次迭代对同一个deck做增量修改，覆盖 deck.revise_deck 的Presentation生命周期"""
+    import deck
+
+    deck_id = deck.create_deck("soak", aippt.generate_ppt_content("soak", args.pages),
+                               args.design_number, args.layout_index)["deck_id"]
+    order = list(range(args.pages, 0, -1))
+
+    def step(i):
+        deck.revise_deck(deck_id, [
+            {"op": "regenerate", "page": i % args.pages + 1},
+            {"op": "reorder", "order": order},
+        ])
+    return step
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="aippt 内存稳定性测试")
+    parser.add_argument("--mode", choices=["generate", "revise"], default="generate",
+                        help="generate: 每次生成整个PPT；revise: 反复增量修改同一个deck")
+    parser.add_argument("--iterations", type=int, default=2000, help="生成次数")
+    parser.add_argument("--warmup", type=int, default=50, help="预热次数，预热后的RSS作为基准")
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--design-number", type=int, default=1)
+    parser.add_argument("--layout-index", type=int, default=0)
+    parser.add_argument("--sample-every", type=int, default=10, help="每隔多少次采样一次RSS")
+    parser.add_argument("--report-every", type=int, default=100, help="每隔多少次输出一次RSS")
+    parser.add_argument("--max-growth-mb", type=float, default=30, help="允许的RSS增长(MB)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # 生成过程的日志和打印量很大，只保留结果
+    logging.disable(logging.WARNING)
+    aippt.chat = FakeChat()
+    stdout = sys.stdout
+
+    # 测量时不主动做完整的垃圾回收，只依赖生产代码自身的回收，
+    # 否则会掩盖没有及时释放的循环引用
+    baseline = None
+    peak = 0
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        try:
+            step = run_revise(args) if args.mode == "revise" else run_generate(args)
+        finally:
+            sys.stdout = stdout
+
+        for i in range(1, args.iterations + 1):
+            sys.stdout = devnull
+            try:
+                step(i)
+            finally:
+                sys.stdout = stdout
+
+            if i == args.warmup:
+                baseline = read_rss(os.getpid())
+                print(f"预热完成，基准RSS {baseline / 2 ** 20:.1f}MB")
+            elif i > args.warmup and i % args.sample_every == 0:
+                peak = max(peak, read_rss(os.getpid()))
+            if i % args.report_every == 0:
+                rss = read_rss(os.getpid())
+                print(f"第{i}次 RSS {rss / 2 ** 20:.1f}MB  平均耗时 {(time.perf_counter() - start) / i * 1000:.0f}ms")
+
+    if baseline is None:
+        print("迭代次数少于预热次数，无法判断内存增长")
+        return 1
+
+    peak = max(peak, read_rss(os.getpid()))
+    growth = (peak - baseline) / 2 ** 20
+    print(f"预热后RSS峰值 {peak / 2 ** 20:.1f}MB，较基准增长 {growth:.1f}MB")
+    if growth > args.max_growth_mb:
+        print(f"RSS增长超过 {args.max_growth_mb}MB，可能存在内存泄漏")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())